@@ -0,0 +1,61 @@
+"""add archive tables
+
+Revision ID: 4c1f7a2e9b3d
+Revises: 91de8dc6e8d1
+Create Date: 2026-10-19 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f7a2e9b3d'
+down_revision = '91de8dc6e8d1'
+branch_labels = None
+depends_on = None
+
+
+def set_sqlite_autoincrement(enabled):
+    # SQLite reuses the highest rowid once it is deleted, unless the table is
+    # declared AUTOINCREMENT. Other backends use sequences which never do.
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in ["items", "labels"]:
+        with op.batch_alter_table(table, recreate="always",
+                                  table_kwargs={"sqlite_autoincrement": enabled}):
+            pass
+
+
+def upgrade():
+    set_sqlite_autoincrement(True)
+    op.create_table('archived_items',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('inventory_number', sa.String),
+        sa.Column('title', sa.String, nullable=False),
+        sa.Column('owner', sa.String),
+        sa.Column('resource_url', sa.String),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+        sa.Column('realm_id', sa.Integer, sa.ForeignKey('realms.id')),
+        sa.Column('is_labeled', sa.Boolean, default=False),
+        sa.Column('is_active', sa.Boolean, default=False),
+        sa.Column('archived_at', sa.DateTime))
+    op.create_index("ix_archived_items_inventory_number", "archived_items",
+                    ["inventory_number"], unique=True)
+    op.create_table('archived_labels',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('type', sa.String, nullable=False),
+        sa.Column('item_id', sa.Integer, sa.ForeignKey('archived_items.id')),
+        sa.Column('media_type', sa.String),
+        sa.Column('attributes', sa.String, default="{}"),
+        sa.Column('url', sa.String),
+        sa.Column('created_at', sa.DateTime))
+    op.create_index("ix_archived_labels_item_id", "archived_labels",
+                    ["item_id"])
+
+
+def downgrade():
+    op.drop_table('archived_labels')
+    op.drop_table('archived_items')
+    set_sqlite_autoincrement(False)
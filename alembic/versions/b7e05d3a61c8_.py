@@ -0,0 +1,31 @@
+"""add metadata version
+
+Revision ID: b7e05d3a61c8
+Revises: 4c1f7a2e9b3d
+Create Date: 2026-10-19 11:03:57.618342
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e05d3a61c8'
+down_revision = '4c1f7a2e9b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    metadata_version = op.create_table('metadata_version',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('version', sa.Integer, nullable=False, default=0),
+        sa.Column('database_id', sa.String))
+    op.bulk_insert(metadata_version, [
+        {'id': 1, 'version': 0, 'database_id': uuid.uuid4().hex}])
+
+
+def downgrade():
+    op.drop_table('metadata_version')
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Compare listing the hot item table before and after archiving.
+
+Usage: python benchmarks/archive.py [DATABASE] [ITEMS] [INACTIVE_RATIO]
+
+The database should be empty; it is populated with ITEMS items of which
+INACTIVE_RATIO are inactive. Defaults to an in-memory SQLite database with
+2,000,000 items and a ratio of 0.8.
+"""
+
+import sys
+import time
+
+import sqlalchemy
+from sqlalchemy import desc
+
+from invent.sql import *
+
+
+def time_listing(session, runs=10):
+    start = time.perf_counter()
+    for _ in range(runs):
+        session.query(Item).order_by(desc("updated_at")).limit(20).all()
+        session.query(Item).filter(Item.owner == "nobody").count()
+    return (time.perf_counter() - start) / runs
+
+
+def main(argv=sys.argv[1:]):
+    database = argv[0] if len(argv) > 0 else "sqlite://"
+    count = int(argv[1]) if len(argv) > 1 else 2000000
+    ratio = float(argv[2]) if len(argv) > 2 else 0.8
+
+    engine = sqlalchemy.create_engine(database)
+    create_all(engine)
+    session = sqlalchemy.orm.sessionmaker(bind=engine)()
+
+    realm = Realm(name="Benchmark", prefix="BENCH")
+    session.add(realm)
+    session.commit()
+
+    inactive = int(count * ratio)
+    chunk = 50000
+    for offset in range(0, count, chunk):
+        session.execute(Item.__table__.insert(), [
+            {"inventory_number": "BENCH-{:08X}".format(i),
+             "title": "Item {}".format(i),
+             "realm_id": realm.id,
+             "is_active": i >= inactive}
+            for i in range(offset, min(offset + chunk, count))])
+        session.commit()
+
+    print("Before archiving: {:.4f}s per run".format(time_listing(session)))
+    start = time.perf_counter()
+    archived = sum(count for count, _ in archive_items(session,
+                                                       batch_size=10000))
+    print("Archived {} items in {:.2f}s".format(
+        archived, time.perf_counter() - start))
+    print("After archiving:  {:.4f}s per run".format(time_listing(session)))
+
+
+if __name__ == "__main__":
+    main()
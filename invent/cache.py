@@ -0,0 +1,193 @@
+# coding: utf-8
+
+import hashlib
+import os
+import sqlite3
+import time
+
+import sqlalchemy.engine.url
+import sqlalchemy.orm
+
+from invent.sql import Realm, get_metadata_version, bump_metadata_version
+
+_realm_columns = ["id", "prefix", "name", "realm_url_base", "is_external"]
+
+
+def cache_directory():
+    directory = os.getenv("INVENT_CACHE_DIR")
+    if directory is None:
+        directory = os.path.join(os.getenv("XDG_CACHE_HOME",
+                                           os.path.expanduser("~/.cache")),
+                                 "invent")
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return None
+    return directory
+
+
+def resolve_database_url(database):
+    """Return *database* as URL, with relative SQLite paths made absolute.
+
+    Returns None for in-memory SQLite databases.
+    """
+    url = sqlalchemy.engine.url.make_url(database)
+    if url.get_backend_name() == "sqlite":
+        if url.database in {None, "", ":memory:"}:
+            return None
+        url = url.set(database=os.path.abspath(url.database))
+    return url
+
+
+def cache_path(database):
+    """Return the side file caching metadata of *database*, or None.
+
+    In-memory SQLite databases are never shared between processes, so no
+    side file is used for them.
+    """
+    url = resolve_database_url(database)
+    if url is None:
+        return None
+    directory = cache_directory()
+    if directory is None:
+        return None
+    digest = hashlib.sha1(str(url).encode()).hexdigest()
+    return os.path.join(directory, "metadata-{}.sqlite".format(digest))
+
+
+class MetadataCache(object):
+    """Realm cache stored in a local SQLite side file.
+
+    The cache records the metadata version of the database it was built
+    from. The version is checked again at most every *max_age* seconds, so
+    lookups within that window do not query the database at all. Without
+    *database* the cache is kept in memory. The side file is only opened
+    on first use.
+    """
+
+    def __init__(self, database=None, max_age=300):
+        self.database = database
+        self.max_age = max_age
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            path = None
+            if self.database is not None:
+                path = cache_path(self.database)
+            self._conn = sqlite3.connect(path if path is not None
+                                         else ":memory:")
+            with self._conn:
+                self._conn.execute("CREATE TABLE IF NOT EXISTS meta "
+                                   "(key TEXT PRIMARY KEY, value)")
+                self._conn.execute("CREATE TABLE IF NOT EXISTS realms "
+                                   "(id INTEGER PRIMARY KEY, "
+                                   "prefix TEXT UNIQUE, name TEXT, "
+                                   "realm_url_base TEXT, is_external BOOLEAN)")
+        return self._conn
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?",
+                                (key,)).fetchone()
+        if row is not None:
+            return row[0]
+
+    def refresh(self, session, force=False):
+        now = time.time()
+        checked_at = self._meta("checked_at")
+        if not force and checked_at is not None \
+                and now - checked_at < self.max_age:
+            return
+        version, database_id = get_metadata_version(session)
+        url = None
+        if self.database is not None:
+            url = repr(resolve_database_url(self.database))
+        with self.conn:
+            if force or version != self._meta("version") \
+                    or database_id != self._meta("database_id") \
+                    or url != self._meta("url"):
+                self.conn.execute("DELETE FROM realms")
+                self.conn.executemany(
+                    "INSERT INTO realms VALUES (?, ?, ?, ?, ?)",
+                    ((r.id, r.prefix, r.name, r.realm_url_base,
+                      r.is_external)
+                     for r in session.query(Realm)))
+                self.conn.executemany("INSERT OR REPLACE INTO meta VALUES "
+                                      "(?, ?)",
+                                      [("version", version),
+                                       ("database_id", database_id),
+                                       ("url", url)])
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES "
+                              "('checked_at', ?)", (now,))
+
+    def invalidate(self, session):
+        bump_metadata_version(session)
+        self.refresh(session, force=True)
+
+    def _realms(self, session, where="", params=()):
+        self.refresh(session)
+        query = "SELECT {} FROM realms {} ORDER BY id".format(
+            ", ".join(_realm_columns), where)
+        realms = []
+        for row in self.conn.execute(query, params):
+            realm = Realm(**dict(zip(_realm_columns, row)))
+            realm.is_external = bool(realm.is_external)
+            # Detached, so that it can be merged into a session with
+            # load=False
+            sqlalchemy.orm.make_transient_to_detached(realm)
+            realms.append(realm)
+        return realms
+
+    def _realm(self, session, where, params=()):
+        realms = self._realms(session, where, params)
+        if not realms:
+            # The realm may have been added since the cache was checked
+            self.refresh(session, force=True)
+            realms = self._realms(session, where, params)
+        if realms:
+            return realms[0]
+
+    def realm_by_prefix(self, session, prefix):
+        return self._realm(session, "WHERE prefix = ?", (prefix,))
+
+    def realm_by_id(self, session, id):
+        return self._realm(session, "WHERE id = ?", (id,))
+
+    def default_realm(self, session):
+        return self._realm(session, "WHERE NOT is_external")
+
+    def realms(self, session):
+        return self._realms(session)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class UncachedMetadata(object):
+    """Drop-in for MetadataCache which queries the database every time.
+
+    It never touches metadata_version, so it also works on databases
+    without it.
+    """
+
+    def invalidate(self, session):
+        pass
+
+    def realm_by_prefix(self, session, prefix):
+        return session.query(Realm).filter(Realm.prefix == prefix).first()
+
+    def realm_by_id(self, session, id):
+        return session.query(Realm).get(id)
+
+    def default_realm(self, session):
+        return session.query(Realm).filter(
+            Realm.is_external == False).first()
+
+    def realms(self, session):
+        return session.query(Realm).all()
+
+    def close(self):
+        pass
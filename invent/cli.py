@@ -8,6 +8,7 @@ import qrcode
 import sqlalchemy
 from sqlalchemy import or_, asc, desc, any_
 
+import invent.cache
 import invent.label
 from invent.sql import *
 
@@ -76,32 +77,55 @@ def generate_labels(args, session, engine):
 def show_item(args, session, engine):
     items = session.query(Item).filter(
         Item.inventory_number.in_(args.inventory_numbers)).all()
+    if args.include_archive:
+        items.extend(session.query(ArchivedItem).filter(
+            ArchivedItem.inventory_number.in_(args.inventory_numbers)).all())
     for item in items:
         print_item(item, show_qrcode=args.show_qrcode)
         print()
 
 
 def create_db(args, session, engine):
-    Base.metadata.create_all(engine)
+    create_all(engine)
     if args.alembic_ini:
         import alembic.config
         alembic_cfg = alembic.config.Config(args.alembic_ini)
         alembic.command.stamp(alembic_cfg, "head")
 
 
+def add_realm(args, session, engine):
+    realm = Realm()
+    realm.prefix = args.prefix
+    realm.name = args.name
+    realm.realm_url_base = args.url_base
+    session.add(realm)
+    session.commit()
+    args.metadata_cache.invalidate(session)
+
+
 def add_item(args, session, engine):
+    cache = args.metadata_cache
     if args.realm is None:
-        realm = session.query(Realm).filter(Realm.is_external == False).first()
+        cached_realm = cache.default_realm(session)
     else:
-        realm = session.query(Realm).filter(Realm.prefix == args.realm).first()
-    if not realm:
-        return
+        cached_realm = cache.realm_by_prefix(session, args.realm)
+    if not cached_realm:
+        if args.realm is None:
+            sys.exit("No internal realm to add the item to")
+        sys.exit("Unknown realm: {}".format(args.realm))
+    if args.inventory_number:
+        archived = session.query(ArchivedItem.id).filter(
+            ArchivedItem.inventory_number == args.inventory_number).first()
+        if archived:
+            sys.exit("Inventory number {} is already archived".format(
+                args.inventory_number))
+    realm = session.merge(cached_realm, load=False)
     item = Item()
     if args.inventory_number:
         item.inventory_number = args.inventory_number
     if args.owner:
         item.owner = args.owner
-    item.realm_id = realm.id
+    item.realm = realm
     item.resource_url = args.resource_url
     item.title = args.title
     if args.active is not None:
@@ -110,10 +134,13 @@ def add_item(args, session, engine):
         item.is_labeled = args.labeled
     session.add(item)
     session.commit()
+    # Committing expires the realm, restore it from the cache
+    session.merge(cached_realm, load=False)
     if not item.inventory_number:
         item.generate_inventory_number()
         session.add(item)
         session.commit()
+        session.merge(cached_realm, load=False)
     print_item(item)
     if args.label_type:
         generate_item_label(args.label_type, item, dict(args.label_attribute),
@@ -142,29 +169,67 @@ def update_item(args, session, engine):
 
 
 def list_realms(args, session, engine):
-    realms = session.query(Realm).filter(Realm.is_external.in_([args.external,
-                                                                not args.internal])).all()
+    realms = args.metadata_cache.realms(session)
     for realm in realms:
+        if realm.is_external not in {args.external, not args.internal}:
+            continue
         print(args.format.format(realm=realm))
 
 
 def list_items(args, session, engine):
-    query = session.query(Item)
+    realm = None
     if args.realm is not None:
-        realm = session.query(Realm).filter(Realm.prefix == args.realm).first()
+        realm = args.metadata_cache.realm_by_prefix(session, args.realm)
+        if not realm:
+            sys.exit("Unknown realm: {}".format(args.realm))
+    # Load realms from the cache into the session, so that item.realm is
+    # resolved without a query
+    realms = [session.merge(r, load=False)
+              for r in args.metadata_cache.realms(session)]
+    models = [Item]
+    if args.include_archive:
+        models.append(ArchivedItem)
+
+    def filter_items(query, model):
         if realm is not None:
-            query = query.filter(Item.realm_id == realm.id)
-    if args.owner is not None:
-        query = query.filter(Item.owner == str(args.owner))
-    if args.active is not None:
-        query = query.filter(Item.is_active == args.active)
-    if args.labeled is not None:
-        query = query.filter(Item.is_labeled == args.labeled)
-    query = query.order_by(desc(args.sort_key))
+            query = query.filter(model.realm_id == realm.id)
+        if args.owner is not None:
+            query = query.filter(model.owner == str(args.owner))
+        if args.active is not None:
+            query = query.filter(model.is_active == args.active)
+        if args.labeled is not None:
+            query = query.filter(model.is_labeled == args.labeled)
+        return query
+
+    if len(models) == 1:
+        query = filter_items(session.query(Item), Item)
+        sort_key = args.sort_key
+    else:
+        # Merge hot and archived items in the database, so that ordering
+        # (including NULLs) matches the single table case
+        query = sqlalchemy.union_all(*[
+            filter_items(session.query(
+                sqlalchemy.literal(index).label("model"),
+                model.id.label("id"),
+                getattr(model, args.sort_key).label("sort_key")),
+                model).statement
+            for index, model in enumerate(models)])
+        sort_key = "sort_key"
+    query = query.order_by(desc(sort_key))
     if args.limit > 0:
         query = query.limit(args.limit)
     query = query.offset(args.offset)
-    items = query.all()
+    if len(models) == 1:
+        items = query.all()
+    else:
+        rows = session.execute(query).fetchall()
+        loaded = {}
+        for index, model in enumerate(models):
+            ids = [row.id for row in rows if row.model == index]
+            if ids:
+                for item in session.query(model).filter(model.id.in_(ids)):
+                    loaded[index, item.id] = item
+        items = [loaded[row.model, row.id] for row in rows]
     item_format = args.format
     if item_format is None:
         if args.show_title:
@@ -175,9 +240,34 @@ def list_items(args, session, engine):
         print(item_format.format(item=item))
 
 
+def archive(args, session, engine):
+    realm_id = None
+    if args.realm is not None:
+        realm = args.metadata_cache.realm_by_prefix(session, args.realm)
+        if not realm:
+            sys.exit("Unknown realm: {}".format(args.realm))
+        realm_id = realm.id
+    total = 0
+    failed = 0
+    for count, conflicts in archive_items(session, batch_size=args.batch_size,
+                                          realm_id=realm_id):
+        total += count
+        failed += len(conflicts)
+        for id, inventory_number in conflicts:
+            print("Not archiving item {} ({}): id or inventory number already "
+                  "archived".format(id, inventory_number), file=sys.stderr)
+        if not args.quiet:
+            print("Archived {} items ({} total)".format(count, total))
+    if failed:
+        sys.exit(1)
+
+
 def main(argv=sys.argv[1:]):
     argparser = argparse.ArgumentParser()
     argparser.add_argument("--database", "-D")
+    argparser.add_argument("--no-metadata-cache", dest="metadata_cache",
+                           action="store_false", default=True)
+    argparser.add_argument("--metadata-cache-max-age", type=int, default=300)
     subparsers = argparser.add_subparsers(dest="subcommand")
 
     add_item_subparser = subparsers.add_parser("add-item", aliases=["add"])
@@ -248,6 +338,8 @@ def main(argv=sys.argv[1:]):
                                       action="store_true")
     list_items_subparser.add_argument("--hide-title", dest="show_title",
                                       action="store_false")
+    list_items_subparser.add_argument("--include-archive", "-A",
+                                      action="store_true")
     list_items_subparser.add_argument("--format", default=None)
     list_items_subparser.add_argument("--csv", dest="format",
                                       action="store_const",
@@ -263,8 +355,16 @@ def main(argv=sys.argv[1:]):
                                      action="store_true")
     show_item_subparser.add_argument("--hide-qrcode", "-Q", action="store_false",
                                      dest="show_qrcode")
+    show_item_subparser.add_argument("--include-archive", "-A",
+                                     action="store_true")
     show_item_subparser.add_argument("inventory_numbers", nargs="+")
 
+    archive_subparser = subparsers.add_parser("archive")
+    archive_subparser.add_argument("--realm", "-R")
+    archive_subparser.add_argument("--batch-size", "-b", type=int,
+                                   default=1000)
+    archive_subparser.add_argument("--quiet", "-q", action="store_true")
+
     generate_label_subparser = subparsers.add_parser("generate-label")
     generate_label_subparser.add_argument("--output", "-o")
     generate_label_subparser.add_argument("--attr", "-a", nargs=2, action="append",
@@ -313,15 +413,23 @@ def main(argv=sys.argv[1:]):
         subcommand = create_db
     elif args.subcommand == "generate-label":
         subcommand = generate_labels
+    elif args.subcommand == "archive":
+        subcommand = archive
 
     if subcommand is None:
         argparser.print_help()
     else:
+        if args.metadata_cache:
+            args.metadata_cache = invent.cache.MetadataCache(
+                args.database, max_age=args.metadata_cache_max_age)
+        else:
+            args.metadata_cache = invent.cache.UncachedMetadata()
         session = Session()
         try:
             subcommand(args, session=session, engine=engine)
         finally:
             session.close()
+            args.metadata_cache.close()
 
 
 if __name__ == "__main__":
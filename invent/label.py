@@ -13,6 +13,14 @@ label_env = jinja2.Environment(
     loader=label_loader)
 
 
+def get_label_template(name):
+    if label_env.bytecode_cache is None:
+        # Jinja's default directory is private to the current user, which
+        # matters as the cache holds marshalled bytecode
+        label_env.bytecode_cache = jinja2.FileSystemBytecodeCache()
+    return label_env.get_template(name)
+
+
 def svg2pdf(input=None, output=None, dpi=(72, 72), wait=True,
             rsvg_convert="rsvg-convert"):
     argv = [rsvg_convert, "-f", "pdf"]
@@ -79,7 +87,7 @@ class LabelSimple62x29(LabelType):
 
     def _generate(self, attributes, output=None):
         generate_qrcode = attributes.get("generate_qrcode", True)
-        tpl = label_env.get_template("simple-62x29.svg")
+        tpl = get_label_template("simple-62x29.svg")
         qr = None
         if generate_qrcode and "inventory_number" in attributes:
             qr = qrcode.make(attributes["inventory_number"],
@@ -109,7 +117,7 @@ class LabelSimple100x62(LabelType):
     def _generate(self, attributes, output=None):
         generate_qrcode = attributes.get("generate_qrcode", True)
         url_base = attributes.get("url_base")
-        tpl = label_env.get_template("simple-100x62.svg")
+        tpl = get_label_template("simple-100x62.svg")
         qr = None
         if generate_qrcode and "inventory_number" in attributes:
             qr_data = attributes["inventory_number"]
@@ -1,32 +1,18 @@
 # coding: utf-8
 
 import datetime
+import uuid
+
 import sqlalchemy
 import sqlalchemy.orm
 import sqlalchemy.ext.declarative
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import or_, Column, Integer, String, DateTime, ForeignKey, Boolean, JSON
 from sqlalchemy.orm import relationship
 
 Base = sqlalchemy.ext.declarative.declarative_base()
 
 
-class Item(Base):
-    __tablename__ = "items"
-
-    id = Column(Integer, primary_key=True)
-    inventory_number = Column(String, unique=True, index=True)
-    title = Column(String, nullable=False)
-    owner = Column(String)
-    resource_url = Column(String)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
-    updated_at = Column(DateTime, onupdate=datetime.datetime.utcnow)
-    realm_id = Column(Integer, ForeignKey('realms.id'))
-    is_labeled = Column(Boolean, default=False)
-    is_active = Column(Boolean, default=True)
-
-    realm = relationship("Realm")
-    labels = relationship("Label", back_populates="item")
-
+class ItemMixin(object):
     def generate_inventory_number(self, format="{prefix}-{id:06X}"):
         if self.inventory_number is None:
             self.inventory_number = format.format(prefix=self.realm.prefix,
@@ -44,8 +30,28 @@ class Item(Base):
             return self.realm.prefix
 
     def __repr__(self):
-        return "<Item(id={item.id!r}, inventory_number={item.inventory_number!r}" \
-            ", title={item.title!r}>".format(item=self)
+        return "<{cls}(id={item.id!r}, inventory_number={item.inventory_number!r}" \
+            ", title={item.title!r}>".format(cls=type(self).__name__, item=self)
+
+
+class Item(ItemMixin, Base):
+    __tablename__ = "items"
+    # Ids of archived items must not be handed out again
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    inventory_number = Column(String, unique=True, index=True)
+    title = Column(String, nullable=False)
+    owner = Column(String)
+    resource_url = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, onupdate=datetime.datetime.utcnow)
+    realm_id = Column(Integer, ForeignKey('realms.id'))
+    is_labeled = Column(Boolean, default=False)
+    is_active = Column(Boolean, default=True)
+
+    realm = relationship("Realm")
+    labels = relationship("Label", back_populates="item")
 
 
 class Realm(Base):
@@ -60,6 +66,7 @@ class Realm(Base):
 
 class Label(Base):
     __tablename__ = "labels"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True)
     label_type = Column("type", String, nullable=False)
@@ -72,5 +79,129 @@ class Label(Base):
     item = relationship("Item", back_populates="labels")
 
 
+class ArchivedItem(ItemMixin, Base):
+    __tablename__ = "archived_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    inventory_number = Column(String, unique=True, index=True)
+    title = Column(String, nullable=False)
+    owner = Column(String)
+    resource_url = Column(String)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    realm_id = Column(Integer, ForeignKey('realms.id'))
+    is_labeled = Column(Boolean, default=False)
+    is_active = Column(Boolean, default=False)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    realm = relationship("Realm")
+    labels = relationship("ArchivedLabel", back_populates="item")
+
+
+class ArchivedLabel(Base):
+    __tablename__ = "archived_labels"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    label_type = Column("type", String, nullable=False)
+    item_id = Column(Integer, ForeignKey("archived_items.id"), index=True)
+    media_type = Column(String)
+    attributes = Column(String, default="{}")
+    url = Column(String)
+    created_at = Column(DateTime)
+
+    item = relationship("ArchivedItem", back_populates="labels")
+
+
+class MetadataVersion(Base):
+    __tablename__ = "metadata_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    database_id = Column(String)
+
+
+def get_metadata_version(session):
+    """Return the metadata version and the random id of the database."""
+    row = session.query(MetadataVersion.version,
+                        MetadataVersion.database_id).filter(
+        MetadataVersion.id == 1).first()
+    if row is None:
+        return 0, None
+    return row.version, row.database_id
+
+
+def bump_metadata_version(session):
+    """Increment the metadata version, invalidating metadata caches."""
+    session.query(MetadataVersion).filter(MetadataVersion.id == 1).update(
+        {MetadataVersion.version: MetadataVersion.version + 1},
+        synchronize_session=False)
+    session.commit()
+
+
+def archive_items(session, batch_size=1000, realm_id=None):
+    """Move inactive items and their labels into the archive tables.
+
+    Items are moved in batches of *batch_size*, each batch in its own
+    transaction. Items whose id, inventory number or label ids are already
+    taken in the archive are left in place. Yields the number of items
+    moved and a list of ``(id, inventory_number)`` of such conflicting
+    items per batch.
+    """
+    item_columns = [c.name for c in Item.__table__.columns]
+    label_columns = [c.name for c in Label.__table__.columns]
+    last_id = None
+    while True:
+        query = session.query(Item.id).filter(Item.is_active == False)
+        if realm_id is not None:
+            query = query.filter(Item.realm_id == realm_id)
+        if last_id is not None:
+            query = query.filter(Item.id > last_id)
+        # Lock the batch, so that items cannot be reactivated or get new
+        # labels while they are moved
+        ids = [id for id, in
+               query.order_by(Item.id).limit(batch_size).with_for_update()]
+        if not ids:
+            break
+        last_id = ids[-1]
+        conflicts = session.query(Item.id, Item.inventory_number).filter(
+            Item.id.in_(ids),
+            or_(Item.id.in_(session.query(ArchivedItem.id)),
+                Item.inventory_number.in_(
+                    session.query(ArchivedItem.inventory_number)),
+                Item.id.in_(session.query(Label.item_id).filter(
+                    Label.id.in_(session.query(ArchivedLabel.id)))))).all()
+        conflicting_ids = {id for id, _ in conflicts}
+        ids = [id for id in ids if id not in conflicting_ids]
+        if ids:
+            # Backends without row locks, like SQLite, only serialize from
+            # the first write on, so check is_active again while copying
+            session.execute(ArchivedItem.__table__.insert().from_select(
+                item_columns,
+                sqlalchemy.select([Item.__table__.c[c] for c in item_columns])
+                .where(Item.__table__.c.id.in_(ids))
+                .where(Item.__table__.c.is_active == False)))
+            ids = [id for id, in session.query(ArchivedItem.id).filter(
+                ArchivedItem.id.in_(ids))]
+            label_ids = [id for id, in session.query(Label.id).filter(
+                Label.item_id.in_(ids))]
+            session.execute(ArchivedLabel.__table__.insert().from_select(
+                label_columns,
+                sqlalchemy.select([Label.__table__.c[c] for c in label_columns])
+                .where(Label.__table__.c.id.in_(label_ids))))
+            session.query(Label).filter(Label.id.in_(label_ids)).delete(
+                synchronize_session=False)
+            session.query(Item).filter(Item.id.in_(ids)).delete(
+                synchronize_session=False)
+        session.commit()
+        yield len(ids), conflicts
+
+
 def create_all(engine):
     Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        version = conn.execute(sqlalchemy.select([MetadataVersion.id]).where(
+            MetadataVersion.id == 1)).first()
+        if version is None:
+            conn.execute(MetadataVersion.__table__.insert(),
+                         {"id": 1, "version": 0,
+                          "database_id": uuid.uuid4().hex})